@@ -1,8 +1,31 @@
 import streamlit as st
+import queue
+import threading
 import time
-from src.chain import ask
 from src.llm import get_provider_info
-from src.config import SUGGESTED_QUESTIONS
+from src.semantic_cache import lookup_cached_answer, cache_answer
+from src.persistence import (
+    new_session_id,
+    is_valid_session_id,
+    append_message,
+    save_metadata,
+    list_sessions,
+    load_messages,
+)
+from src.theme import inject_css
+from src.ui import get_source_store, sources_html, response_meta_html
+from src.config import (
+    SUGGESTED_QUESTIONS,
+    STREAM_FLUSH_INTERVAL,
+    STREAM_BUFFER_SIZE,
+    HISTORY_MAX_MESSAGES,
+    CHAT_RENDER_WINDOW,
+    ACKNOWLEDGEMENTS,
+    ACKNOWLEDGEMENT_REPLY,
+    CHAT_HISTORY_DIR,
+    METADATA_SAVE_EVERY,
+    RECENT_SESSIONS_LIMIT,
+)
 
 # --- Page config ---
 st.set_page_config(
@@ -15,297 +38,32 @@ st.set_page_config(
 provider = get_provider_info()
 
 # --- Custom CSS: Stripe-inspired light theme ---
-st.markdown("""
-<style>
-    @import url('https://fonts.googleapis.com/css2?family=Plus+Jakarta+Sans:wght@400;500;600;700&display=swap');
-
-    /* Hide default Streamlit chrome */
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}
-    header {visibility: hidden;}
-
-    /* Global typography */
-    html, body, [class*="css"] {
-        font-family: 'Plus Jakarta Sans', -apple-system, BlinkMacSystemFont, sans-serif;
-    }
-
-    /* Top accent bar — thin, elegant */
-    .stApp {
-        border-top: 3px solid #635BFF;
-    }
-
-    /* Main container breathing room */
-    .stMainBlockContainer {
-        max-width: 820px;
-        padding-top: 2rem;
-    }
-
-    /* Hero title */
-    .hero-title {
-        font-family: 'Plus Jakarta Sans', sans-serif;
-        font-size: 2rem;
-        font-weight: 700;
-        color: #0A2540;
-        margin-bottom: 0;
-        line-height: 1.2;
-        letter-spacing: -0.02em;
-    }
-    .hero-subtitle {
-        color: #425466;
-        font-size: 1rem;
-        margin-top: 0.5rem;
-        margin-bottom: 2rem;
-        line-height: 1.6;
-    }
-
-    /* Sidebar — clean light style */
-    section[data-testid="stSidebar"] {
-        background-color: #F6F9FC;
-        border-right: 1px solid #E3E8EE;
-    }
-    section[data-testid="stSidebar"] .stMarkdown p,
-    section[data-testid="stSidebar"] .stMarkdown span,
-    section[data-testid="stSidebar"] .stCaption {
-        font-family: 'Plus Jakarta Sans', sans-serif;
-    }
-
-    .sidebar-brand {
-        display: flex;
-        align-items: center;
-        gap: 0.6rem;
-        margin-bottom: 0.4rem;
-    }
-    .sidebar-brand-icon {
-        width: 28px;
-        height: 28px;
-        background: #635BFF;
-        border-radius: 6px;
-        display: flex;
-        align-items: center;
-        justify-content: center;
-        color: white;
-        font-size: 0.85rem;
-        font-weight: 700;
-        flex-shrink: 0;
-    }
-    .sidebar-brand-text {
-        font-size: 1.05rem;
-        font-weight: 700;
-        color: #0A2540;
-        letter-spacing: -0.01em;
-    }
-    .sidebar-badge {
-        display: inline-block;
-        background: #F0EEFF;
-        color: #635BFF;
-        border-radius: 10px;
-        padding: 0.15rem 0.5rem;
-        font-size: 0.6rem;
-        font-weight: 600;
-        text-transform: uppercase;
-        letter-spacing: 0.5px;
-    }
-
-    /* Chat messages */
-    .stChatMessage {
-        border-radius: 10px;
-        margin-bottom: 0.5rem;
-    }
-
-    /* Suggested question buttons — styled as clean cards */
-    .stButton > button {
-        font-family: 'Plus Jakarta Sans', sans-serif !important;
-        background: #FFFFFF !important;
-        color: #0A2540 !important;
-        border: 1px solid #E3E8EE !important;
-        border-radius: 10px !important;
-        padding: 0.75rem 1rem !important;
-        font-size: 0.88rem !important;
-        font-weight: 500 !important;
-        text-align: left !important;
-        transition: all 0.2s ease !important;
-        box-shadow: 0 1px 3px rgba(0, 0, 0, 0.04) !important;
-    }
-    .stButton > button:hover {
-        border-color: #635BFF !important;
-        box-shadow: 0 2px 8px rgba(99, 91, 255, 0.1) !important;
-        transform: translateY(-1px) !important;
-    }
-    .stButton > button:active {
-        transform: translateY(0) !important;
-    }
-
-    /* Sidebar buttons */
-    section[data-testid="stSidebar"] .stButton > button {
-        background: #FFFFFF !important;
-        border: 1px solid #E3E8EE !important;
-        color: #425466 !important;
-    }
-    section[data-testid="stSidebar"] .stButton > button:hover {
-        border-color: #635BFF !important;
-        color: #635BFF !important;
-    }
-
-    /* Source citation cards */
-    .source-card {
-        background: #FFFFFF;
-        border: 1px solid #E3E8EE;
-        border-radius: 8px;
-        padding: 0.85rem 1rem;
-        margin-bottom: 0.6rem;
-        transition: border-color 0.2s ease;
-    }
-    .source-card:hover {
-        border-color: #635BFF;
-    }
-    .source-header {
-        display: flex;
-        justify-content: space-between;
-        align-items: center;
-        margin-bottom: 0.15rem;
-    }
-    .source-title {
-        color: #0A2540;
-        font-weight: 600;
-        font-size: 0.85rem;
-    }
-    .source-score {
-        background: #F0EEFF;
-        color: #635BFF;
-        font-size: 0.68rem;
-        padding: 0.12rem 0.45rem;
-        border-radius: 8px;
-        font-weight: 600;
-    }
-    .source-category {
-        color: #635BFF;
-        font-size: 0.65rem;
-        font-weight: 600;
-        text-transform: uppercase;
-        letter-spacing: 0.5px;
-        margin-bottom: 0.2rem;
-    }
-    .source-preview {
-        color: #68778D;
-        font-size: 0.78rem;
-        line-height: 1.55;
-        margin-top: 0.3rem;
-    }
-
-    /* Response metadata */
-    .response-meta {
-        display: flex;
-        gap: 0.75rem;
-        color: #8898AA;
-        font-size: 0.72rem;
-        margin-top: 0.75rem;
-        padding-top: 0.5rem;
-        border-top: 1px solid #E3E8EE;
-    }
-    .meta-item {
-        display: flex;
-        align-items: center;
-        gap: 0.25rem;
-    }
-    .meta-dot {
-        width: 5px;
-        height: 5px;
-        border-radius: 50%;
-        background: #635BFF;
-        display: inline-block;
-    }
-
-    /* Tech stack pills in sidebar */
-    .tech-pill {
-        display: inline-block;
-        background: #FFFFFF;
-        border: 1px solid #E3E8EE;
-        border-radius: 14px;
-        padding: 0.18rem 0.55rem;
-        font-size: 0.68rem;
-        color: #425466;
-        margin: 0.12rem;
-        font-weight: 500;
-    }
-
-    /* How it works steps in sidebar */
-    .step-container {
-        display: flex;
-        align-items: flex-start;
-        gap: 0.65rem;
-        margin-bottom: 0.65rem;
-    }
-    .step-num {
-        background: #635BFF;
-        color: #FFFFFF;
-        width: 22px;
-        height: 22px;
-        border-radius: 50%;
-        display: flex;
-        align-items: center;
-        justify-content: center;
-        font-size: 0.7rem;
-        font-weight: 700;
-        flex-shrink: 0;
-        margin-top: 2px;
-    }
-    .step-text {
-        color: #425466;
-        font-size: 0.8rem;
-        line-height: 1.45;
-    }
-
-    /* Chat input area */
-    .stChatInput {
-        border-color: #E3E8EE;
-    }
-    .stChatInput > div {
-        border-color: #E3E8EE !important;
-        border-radius: 10px !important;
-    }
-
-    /* Expander styling */
-    .streamlit-expanderHeader {
-        font-size: 0.85rem;
-        font-weight: 600;
-        color: #425466;
-    }
-
-    /* Dividers */
-    hr {
-        border-color: #E3E8EE !important;
-    }
-
-    /* Links */
-    a {
-        color: #635BFF !important;
-        text-decoration: none !important;
-    }
-    a:hover {
-        color: #0A2540 !important;
-    }
-
-    /* Scrollbar — subtle */
-    ::-webkit-scrollbar {
-        width: 6px;
-    }
-    ::-webkit-scrollbar-track {
-        background: #F6F9FC;
-    }
-    ::-webkit-scrollbar-thumb {
-        background: #D8DEE6;
-        border-radius: 3px;
-    }
-    ::-webkit-scrollbar-thumb:hover {
-        background: #8898AA;
-    }
-</style>
-""", unsafe_allow_html=True)
+inject_css("base.css", "app.css")
 
 
 # --- Session state ---
+def restore_messages(session_id: str) -> list[dict]:
+    """Load a saved transcript, turning JSON source ref lists back into tuples."""
+    messages = load_messages(session_id)
+    for message in messages:
+        if message.get("source_refs"):
+            message["source_refs"] = [tuple(ref) for ref in message["source_refs"]]
+    return messages
+
+
 if "messages" not in st.session_state:
     st.session_state.messages = []
+    if CHAT_HISTORY_DIR:
+        # The session id lives in the URL so a page refresh restores the chat.
+        session_id = st.query_params.get("session", "")
+        if is_valid_session_id(session_id):
+            st.session_state.messages = restore_messages(session_id)
+        else:
+            session_id = new_session_id()
+            st.query_params["session"] = session_id
+        st.session_state.session_id = session_id
+if "answer_cache" not in st.session_state:
+    st.session_state.answer_cache = []
 
 
 # --- Sidebar ---
@@ -323,9 +81,29 @@ with st.sidebar:
     st.divider()
 
     if st.button("New Conversation", use_container_width=True):
+        # answer_cache is kept: entries are keyed by their history, so a new
+        # conversation only matches answers that were also given cold.
         st.session_state.messages = []
+        if CHAT_HISTORY_DIR:
+            st.session_state.session_id = new_session_id()
+            st.query_params["session"] = st.session_state.session_id
         st.rerun()
 
+    if CHAT_HISTORY_DIR:
+        recent = [
+            m for m in list_sessions(RECENT_SESSIONS_LIMIT + 1)
+            if m.get("session_id") != st.session_state.session_id
+        ][:RECENT_SESSIONS_LIMIT]
+        if recent:
+            st.markdown("**Recent Conversations**")
+            for meta in recent:
+                session_id = meta["session_id"]
+                if st.button(meta.get("title", "Untitled")[:40], key=f"session_{session_id}", use_container_width=True):
+                    st.session_state.session_id = session_id
+                    st.session_state.messages = restore_messages(session_id)
+                    st.query_params["session"] = session_id
+                    st.rerun()
+
     st.divider()
 
     # How it works
@@ -379,88 +157,256 @@ st.markdown(
 )
 
 
-def render_sources(sources: list[dict]):
-    """Render source citation cards."""
-    with st.expander(f"View Sources ({len(sources)} documents)"):
-        for src in sources:
-            preview = src["content"][:180].replace("\n", " ")
-            st.markdown(f"""
-<div class="source-card">
-    <div class="source-category">{src['category']}</div>
-    <div class="source-header">
-        <span class="source-title">{src['title']}</span>
-        <span class="source-score">{src['score']:.0%} match</span>
-    </div>
-    <div class="source-preview">{preview}...</div>
-</div>
-            """, unsafe_allow_html=True)
+# Flattens line breaks and tabs in one pass when building card previews.
+PREVIEW_WHITESPACE = str.maketrans("\n\r\t", "   ")
+
+
+def remember_chunks(chunks: list[dict]):
+    """Add card data for chunks not yet in the source store."""
+    store = get_source_store()
+    for src in chunks:
+        if src["id"] not in store:
+            store[src["id"]] = {
+                "title": src["title"],
+                "category": src["category"],
+                "preview": src["content"][:180].translate(PREVIEW_WHITESPACE),
+            }
+
+
+def store_sources(sources: list[dict]) -> list[tuple[str, float]]:
+    """Record retrieved chunks in the source store and return their refs."""
+    remember_chunks(sources)
+    return [(src["id"], src["score"]) for src in sources]
+
+
+def render_sources(source_refs: list[tuple[str, float]]):
+    """Render source citation cards from (chunk id, score) refs."""
+    store = get_source_store()
+    missing = [chunk_id for chunk_id, _ in source_refs if chunk_id not in store]
+    if missing:
+        # Messages restored from disk can cite chunks this process hasn't seen.
+        from src.vectorstore import get_chunks
+
+        remember_chunks(get_chunks(missing))
+    with st.expander(f"View Sources ({len(source_refs)} documents)"):
+        st.html(sources_html(tuple(source_refs)))
 
 
 def render_response_meta(response_time: float):
     """Render response metadata footer."""
-    st.markdown(f"""
-<div class="response-meta">
-    <span class="meta-item"><span class="meta-dot"></span> {response_time:.1f}s</span>
-    <span class="meta-item">{provider['provider']}</span>
-    <span class="meta-item">{provider['model']}</span>
-</div>
-    """, unsafe_allow_html=True)
+    st.html(response_meta_html(response_time, provider["provider"], provider["model"]))
+
+
+_STREAM_END = object()
+
+
+def stream_in_background(tokens):
+    """Consume a token generator on its own thread and yield from a queue.
+
+    The LLM response keeps arriving while the script thread is busy
+    rendering, instead of the network read waiting on each render.
+    Exceptions raised by the generator are re-raised here. If the reader
+    stops early (a rerun or a closed tab), the producer closes the
+    generator and exits instead of draining the rest of the answer.
+    """
+    buffer = queue.Queue(maxsize=STREAM_BUFFER_SIZE)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        # Wait while the buffer is full, but give up once the reader is gone
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for token in tokens:
+                if not put(token):
+                    break
+        except Exception as e:
+            put(e)
+        finally:
+            tokens.close()
+            put(_STREAM_END)
+
+    # One thread per stream, so sessions never queue behind each other
+    threading.Thread(target=produce, name="llm-stream", daemon=True).start()
+    try:
+        while (item := buffer.get()) is not _STREAM_END:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+def batched(tokens, interval: float = STREAM_FLUSH_INTERVAL):
+    """Coalesce streamed tokens so the UI updates every interval, not per token."""
+    buffer = []
+    last_flush = time.perf_counter()
+    for token in tokens:
+        buffer.append(token)
+        now = time.perf_counter()
+        if now - last_flush >= interval:
+            yield "".join(buffer)
+            buffer.clear()
+            last_flush = now
+    if buffer:
+        yield "".join(buffer)
+
+
+def is_acknowledgement(question: str) -> bool:
+    """True for short filler replies ("thanks", "ok") that need no retrieval."""
+    return question.lower().strip(".!? ") in ACKNOWLEDGEMENTS
+
+
+def stream_markdown(chunks) -> str:
+    """Render streamed text into a single placeholder and return the full text.
+
+    Each chunk re-renders the accumulated answer once, so pass batched()
+    chunks to keep the number of Markdown renders low.
+    """
+    placeholder = st.empty()
+    text = ""
+    for chunk in chunks:
+        text += chunk
+        placeholder.markdown(text)
+    return text
+
+
+def save_message(message: dict):
+    """Append a message to session state and, if enabled, to the on-disk transcript."""
+    st.session_state.messages.append(message)
+    if not CHAT_HISTORY_DIR:
+        return
+
+    session_id = st.session_state.session_id
+    append_message(session_id, message)
+    exchanges = sum(1 for m in st.session_state.messages if m["role"] == "assistant")
+    if message["role"] == "assistant" and (exchanges == 1 or exchanges % METADATA_SAVE_EVERY == 0):
+        save_metadata(session_id, {
+            "session_id": session_id,
+            "title": st.session_state.messages[0]["content"][:80],
+            "exchanges": exchanges,
+            "updated_at": time.time(),
+        })
 
 
 def handle_question(question: str):
     """Process a question through the RAG pipeline and display the response."""
-    st.session_state.messages.append({"role": "user", "content": question})
+    save_message({"role": "user", "content": question})
 
     with st.chat_message("user"):
         st.markdown(question)
 
     with st.chat_message("assistant"):
         try:
-            result = ask(question, st.session_state.messages[:-1])
-            response_text = st.write_stream(result["answer"])
-            total_time = time.time() - result["start_time"]
-
-            if result["sources"]:
-                render_sources(result["sources"])
+            start = time.perf_counter()
+            if is_acknowledgement(question):
+                source_refs = []
+                response_text = ACKNOWLEDGEMENT_REPLY
+                st.markdown(response_text)
+            else:
+                # Imported here, past the acknowledgement short-circuit, so the
+                # first page paint and filler replies never load the ONNX runtime.
+                from src.embeddings import embed_query
+
+                # Memoized, so repeated and suggested questions embed once
+                embedding = embed_query(question)
+                # Only role and content reach the chain; UI fields stay behind.
+                history = [
+                    {"role": m["role"], "content": m["content"]}
+                    for m in st.session_state.messages[-HISTORY_MAX_MESSAGES - 1:-1]
+                ]
+                # The answer depends on the history too, so it's part of the cache key
+                history_key = tuple((m["role"], m["content"]) for m in history)
+                cached = lookup_cached_answer(st.session_state.answer_cache, embedding, history_key)
+
+                if cached:
+                    source_refs = cached["source_refs"]
+                    response_text = cached["answer"]
+                    st.markdown(response_text)
+                else:
+                    # Only a cache miss needs LangChain and ChromaDB
+                    from src.chain import ask
+
+                    result = ask(question, history, query_embedding=embedding)
+                    source_refs = store_sources(result["sources"])
+                    response_text = stream_markdown(batched(stream_in_background(result["answer"])))
+                    cache_answer(
+                        st.session_state.answer_cache, embedding, response_text, source_refs, history_key
+                    )
+            total_time = time.perf_counter() - start
+
+            if source_refs:
+                render_sources(source_refs)
             render_response_meta(total_time)
 
-            st.session_state.messages.append({
+            save_message({
                 "role": "assistant",
                 "content": response_text,
-                "sources": result["sources"],
+                "source_refs": source_refs,
                 "response_time": total_time,
             })
 
         except Exception as e:
             error_msg = str(e)
-            if "rate" in error_msg.lower() or "limit" in error_msg.lower():
+            lowered = error_msg.lower()
+            if "rate" in lowered or "limit" in lowered:
                 st.error("Rate limit reached. Please wait a moment and try again.")
-            elif "api" in error_msg.lower() or "key" in error_msg.lower():
+            elif "api" in lowered or "key" in lowered:
                 st.error("LLM service unavailable. Check the API configuration.")
             else:
                 st.error(f"Something went wrong: {error_msg}")
 
 
 # --- Suggested questions (shown when chat is empty) ---
+suggestions = st.empty()
+suggested = None
 if not st.session_state.messages:
-    st.markdown("##### Try asking")
-    cols = st.columns(2)
-    for i, q in enumerate(SUGGESTED_QUESTIONS):
-        with cols[i % 2]:
-            if st.button(q, key=f"suggest_{i}", use_container_width=True):
-                handle_question(q)
-                st.rerun()
+    with suggestions.container():
+        st.markdown("##### Try asking")
+        # One pills widget instead of a button per question.
+        suggested = st.pills("Try asking", SUGGESTED_QUESTIONS, label_visibility="collapsed")
 
 # --- Chat history ---
-for message in st.session_state.messages:
+@st.fragment
+def render_earlier_messages(older: list[dict]):
+    """Draw messages outside the render window (text only) on request.
+
+    A fragment, so flipping the toggle reruns just this block rather than
+    the sidebar, CSS and recent history. older is passed in rather than
+    re-sliced so a fragment rerun matches what the last full run drew.
+    """
+    if st.toggle(f"Show {len(older)} earlier messages", key="show_earlier"):
+        for message in older:
+            with st.chat_message(message["role"]):
+                st.markdown(message["content"])
+
+
+# Only the most recent messages are drawn on every rerun; earlier ones are
+# rendered when the user asks for them.
+if older := st.session_state.messages[:-CHAT_RENDER_WINDOW]:
+    render_earlier_messages(older)
+
+for message in st.session_state.messages[-CHAT_RENDER_WINDOW:]:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
-        if message.get("sources"):
-            render_sources(message["sources"])
+        if message.get("source_refs"):
+            render_sources(message["source_refs"])
         if message.get("response_time"):
             render_response_meta(message["response_time"])
 
 # --- Chat input ---
+# handle_question draws the new exchange in place below the history, so
+# neither a typed nor a suggested question needs a rerun.
 if prompt := st.chat_input("Ask about Stripe..."):
+    suggestions.empty()
     handle_question(prompt)
-    st.rerun()
+elif suggested:
+    suggestions.empty()
+    handle_question(suggested)
@@ -1,218 +1,34 @@
 import streamlit as st
 from src.llm import get_provider_info
+from src.vectorstore import get_chunk_count
+from src.theme import inject_css
 
-st.set_page_config(
-    page_title="How It Works — Stripe Support AI",
-    page_icon="💳",
-    layout="wide",
+SECTION_TITLE_TEMPLATE = '<div class="section-title">{title}</div>'
+SECTION_DIVIDER = '<hr class="section-divider">'
+STAT_BOX_TEMPLATE = (
+    '<div class="stat-box"><div class="stat-num">{num}</div><div class="stat-label">{label}</div></div>'
+)
+PIPELINE_CARD_TEMPLATE = (
+    '<div class="pipeline-card"><div class="pipeline-num">{num}</div>'
+    '<div class="pipeline-title">{title}</div><div class="pipeline-desc">{desc}</div></div>'
+)
+TECH_ROW_TEMPLATE = (
+    '<div class="tech-row"><span class="tech-name">{name}</span>'
+    '<span class="tech-detail">{detail}</span><span class="tech-why">{why}</span></div>'
+)
+DECISION_CARD_TEMPLATE = (
+    '<div class="decision-card"><div class="decision-title">{title}</div>'
+    '<div class="decision-desc">{desc}</div></div>'
 )
 
-st.markdown("""
-<style>
-    @import url('https://fonts.googleapis.com/css2?family=Plus+Jakarta+Sans:wght@400;500;600;700&display=swap');
-
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}
-    header {visibility: hidden;}
-
-    html, body, [class*="css"] {
-        font-family: 'Plus Jakarta Sans', -apple-system, BlinkMacSystemFont, sans-serif;
-    }
-
-    .stApp {
-        border-top: 3px solid #635BFF;
-    }
-
-    .stMainBlockContainer {
-        max-width: 960px;
-        padding-top: 2rem;
-    }
-
-    .section-title {
-        font-size: 1.35rem;
-        font-weight: 700;
-        color: #0A2540;
-        margin-bottom: 1rem;
-        letter-spacing: -0.01em;
-    }
-
-    .arch-diagram {
-        background: #F6F9FC;
-        border: 1px solid #E3E8EE;
-        border-radius: 10px;
-        padding: 1.5rem;
-        margin: 1rem 0;
-        font-family: 'SF Mono', 'Fira Code', 'Courier New', monospace;
-        font-size: 0.82rem;
-        line-height: 1.6;
-        overflow-x: auto;
-    }
-
-    .pipeline-card {
-        background: #FFFFFF;
-        border: 1px solid #E3E8EE;
-        border-radius: 10px;
-        padding: 1.5rem;
-        height: 100%;
-        transition: border-color 0.2s ease;
-    }
-    .pipeline-card:hover {
-        border-color: #635BFF;
-    }
-    .pipeline-num {
-        background: #635BFF;
-        color: #FFFFFF;
-        width: 30px;
-        height: 30px;
-        border-radius: 50%;
-        display: flex;
-        align-items: center;
-        justify-content: center;
-        font-weight: 700;
-        font-size: 0.85rem;
-        margin-bottom: 0.75rem;
-    }
-    .pipeline-title {
-        color: #0A2540;
-        font-weight: 600;
-        font-size: 1.05rem;
-        margin-bottom: 0.5rem;
-    }
-    .pipeline-desc {
-        color: #425466;
-        font-size: 0.88rem;
-        line-height: 1.65;
-    }
-
-    .tech-row {
-        display: flex;
-        align-items: center;
-        padding: 0.75rem 0;
-        border-bottom: 1px solid #E3E8EE;
-    }
-    .tech-row:last-child {
-        border-bottom: none;
-    }
-    .tech-name {
-        color: #0A2540;
-        font-weight: 600;
-        font-size: 0.88rem;
-        width: 180px;
-        flex-shrink: 0;
-    }
-    .tech-detail {
-        color: #425466;
-        font-size: 0.85rem;
-        flex: 1;
-    }
-    .tech-why {
-        color: #8898AA;
-        font-size: 0.8rem;
-        flex: 1;
-        font-style: italic;
-    }
-
-    .decision-card {
-        background: #FFFFFF;
-        border: 1px solid #E3E8EE;
-        border-left: 3px solid #635BFF;
-        border-radius: 0 8px 8px 0;
-        padding: 1rem 1.25rem;
-        margin-bottom: 0.75rem;
-        transition: border-left-color 0.2s ease;
-    }
-    .decision-card:hover {
-        border-left-color: #0A2540;
-    }
-    .decision-title {
-        color: #0A2540;
-        font-weight: 600;
-        font-size: 0.92rem;
-        margin-bottom: 0.3rem;
-    }
-    .decision-desc {
-        color: #425466;
-        font-size: 0.85rem;
-        line-height: 1.6;
-    }
-
-    .cta-section {
-        background: #F6F9FC;
-        border: 1px solid #E3E8EE;
-        border-radius: 12px;
-        padding: 2rem;
-        text-align: center;
-        margin-top: 1rem;
-    }
-    .cta-title {
-        font-size: 1.25rem;
-        font-weight: 700;
-        color: #0A2540;
-        margin-bottom: 0.4rem;
-        letter-spacing: -0.01em;
-    }
-    .cta-desc {
-        color: #425466;
-        font-size: 0.92rem;
-        max-width: 560px;
-        margin: 0 auto 1.25rem auto;
-        line-height: 1.6;
-    }
-
-    .stat-box {
-        text-align: center;
-        padding: 1rem;
-    }
-    .stat-num {
-        font-size: 1.8rem;
-        font-weight: 700;
-        color: #0A2540;
-        letter-spacing: -0.02em;
-    }
-    .stat-label {
-        color: #8898AA;
-        font-size: 0.78rem;
-        margin-top: 0.2rem;
-        font-weight: 500;
-    }
-
-    /* Links */
-    a { color: #635BFF !important; text-decoration: none !important; }
-    a:hover { color: #0A2540 !important; }
-
-    /* Dividers */
-    hr { border-color: #E3E8EE !important; }
-
-    /* Sidebar */
-    section[data-testid="stSidebar"] {
-        background-color: #F6F9FC;
-        border-right: 1px solid #E3E8EE;
-    }
-</style>
-""", unsafe_allow_html=True)
-
-# --- Header ---
-st.markdown("# How It Works")
-st.caption("A look under the hood at the RAG (Retrieval Augmented Generation) pipeline powering this assistant.")
-
-# --- Stats row ---
-col1, col2, col3, col4 = st.columns(4)
-with col1:
-    st.markdown('<div class="stat-box"><div class="stat-num">25</div><div class="stat-label">Stripe Doc Pages</div></div>', unsafe_allow_html=True)
-with col2:
-    st.markdown('<div class="stat-box"><div class="stat-num">345</div><div class="stat-label">Embedded Chunks</div></div>', unsafe_allow_html=True)
-with col3:
-    st.markdown('<div class="stat-box"><div class="stat-num">&lt;2s</div><div class="stat-label">Response Time</div></div>', unsafe_allow_html=True)
-with col4:
-    st.markdown('<div class="stat-box"><div class="stat-num">$0</div><div class="stat-label">Running Cost</div></div>', unsafe_allow_html=True)
-
-st.divider()
-
-# --- Architecture ---
-st.markdown('<div class="section-title">Architecture</div>', unsafe_allow_html=True)
+STATS = [
+    ("25", "Stripe Doc Pages"),
+    ("{chunks:,}", "Embedded Chunks"),  # Filled in from the loaded index
+    ("&lt;2s", "Response Time"),
+    ("$0", "Running Cost"),
+]
 
-st.markdown("""
-<div class="arch-diagram">
+ARCHITECTURE_HTML = """<div class="arch-diagram">
 <pre style="color: #425466; margin: 0;">
   User Question
        │
@@ -229,7 +45,7 @@ st.markdown("""
   │  ┌──────────────┐     ┌──────────────────────┐  │
   │  │  <span style="color: #0A2540; font-weight: 600;">ChromaDB</span>     │     │  <span style="color: #0A2540; font-weight: 600;">Groq API</span>            │  │
   │  │  Vector Store │────▶│  Llama 3.3 70B       │  │
-  │  │  (345 chunks) │     │  (streaming)          │  │
+  │  │  {chunk_label}│     │  (streaming)          │  │
   │  └──────┬───────┘     └──────────┬───────────┘  │
   │         │                        │               │
   │    Top 4 chunks            Grounded answer       │
@@ -238,86 +54,30 @@ st.markdown("""
                          ▼
               Response + Source Citations
 </pre>
-</div>
-""", unsafe_allow_html=True)
-
-st.divider()
-
-# --- Pipeline Steps ---
-st.markdown('<div class="section-title">The RAG Pipeline</div>', unsafe_allow_html=True)
-
-col1, col2, col3 = st.columns(3)
-
-with col1:
-    st.markdown("""
-<div class="pipeline-card">
-    <div class="pipeline-num">1</div>
-    <div class="pipeline-title">Retrieve</div>
-    <div class="pipeline-desc">
-        Your question is converted into a vector embedding using the all-MiniLM-L6-v2 model (ONNX runtime).
-        This embedding is compared against pre-computed embeddings of Stripe's documentation stored in ChromaDB.
-        The top 4 most semantically similar document chunks are retrieved, each with a relevance score.
-    </div>
-</div>
-    """, unsafe_allow_html=True)
+</div>"""
 
-with col2:
-    st.markdown("""
-<div class="pipeline-card">
-    <div class="pipeline-num">2</div>
-    <div class="pipeline-title">Augment</div>
-    <div class="pipeline-desc">
-        Retrieved document chunks are injected into a carefully designed prompt template alongside your
-        question and conversation history. The prompt instructs the LLM to answer <strong>only</strong>
-        based on the provided context, preventing hallucination and ensuring accuracy.
-    </div>
-</div>
-    """, unsafe_allow_html=True)
-
-with col3:
-    st.markdown("""
-<div class="pipeline-card">
-    <div class="pipeline-num">3</div>
-    <div class="pipeline-title">Generate</div>
-    <div class="pipeline-desc">
-        The augmented prompt is sent to the LLM, which generates a response grounded in the retrieved
-        documentation. Responses are streamed in real-time for a responsive experience.
-        Source citations are attached so you can verify every answer.
-    </div>
-</div>
-    """, unsafe_allow_html=True)
-
-st.divider()
-
-# --- Tech Stack ---
-st.markdown('<div class="section-title">Tech Stack</div>', unsafe_allow_html=True)
-
-provider = get_provider_info()
-
-tech_items = [
-    ("LLM", f"{provider['provider']} ({provider['model']})", "Fastest free-tier inference — sub-second token generation"),
-    ("Embeddings", "all-MiniLM-L6-v2 (ONNX)", "Lightweight (~80MB), runs on CPU, no GPU required"),
-    ("Vector Database", "ChromaDB (persistent)", "Zero infrastructure, pre-computed embeddings load from disk"),
-    ("Framework", "LangChain", "Industry-standard RAG orchestration with provider flexibility"),
-    ("UI", "Streamlit", "Clean chat interface with custom theme"),
-    ("Knowledge Base", "25 curated Stripe pages", "Covers payments, billing, disputes, webhooks, and more"),
+PIPELINE_STEPS = [
+    (
+        "Retrieve",
+        "Your question is converted into a vector embedding using the all-MiniLM-L6-v2 model (ONNX runtime). "
+        "This embedding is compared against pre-computed embeddings of Stripe's documentation stored in ChromaDB. "
+        "The top 4 most semantically similar document chunks are retrieved, each with a relevance score."
+    ),
+    (
+        "Augment",
+        "Retrieved document chunks are injected into a carefully designed prompt template alongside your "
+        "question and conversation history. The prompt instructs the LLM to answer <strong>only</strong> "
+        "based on the provided context, preventing hallucination and ensuring accuracy."
+    ),
+    (
+        "Generate",
+        "The augmented prompt is sent to the LLM, which generates a response grounded in the retrieved "
+        "documentation. Responses are streamed in real-time for a responsive experience. "
+        "Source citations are attached so you can verify every answer."
+    ),
 ]
 
-for name, detail, why in tech_items:
-    st.markdown(f"""
-<div class="tech-row">
-    <span class="tech-name">{name}</span>
-    <span class="tech-detail">{detail}</span>
-    <span class="tech-why">{why}</span>
-</div>
-    """, unsafe_allow_html=True)
-
-st.divider()
-
-# --- Key Design Decisions ---
-st.markdown('<div class="section-title">Key Design Decisions</div>', unsafe_allow_html=True)
-
-decisions = [
+DECISIONS = [
     (
         "Pre-computed Embeddings",
         "Document embeddings are generated once during the build step and committed to the repository. "
@@ -333,7 +93,8 @@ decisions = [
     (
         "Conversation Memory",
         "The last 5 exchanges are maintained in the prompt context, enabling natural follow-up questions. "
-        "Memory is scoped to the browser session and resets on page refresh."
+        "Memory is scoped to the browser session. With CHAT_HISTORY_DIR set, transcripts are also saved "
+        "to disk, so a page refresh restores the conversation and recent ones are listed in the sidebar."
     ),
     (
         "Score-based Retrieval",
@@ -342,26 +103,76 @@ decisions = [
     ),
 ]
 
-for title, desc in decisions:
-    st.markdown(f"""
-<div class="decision-card">
-    <div class="decision-title">{title}</div>
-    <div class="decision-desc">{desc}</div>
-</div>
-    """, unsafe_allow_html=True)
-
-st.divider()
-
-# --- CTA ---
-st.markdown("""
-<div class="cta-section">
+CTA_HTML = """<div class="cta-section">
     <div class="cta-title">Want Something Like This for Your Business?</div>
     <div class="cta-desc">
         I build AI-powered tools that work in production — customer support agents,
         document Q&A systems, and custom AI workflows. Architected for your scale and budget.
     </div>
-</div>
-""", unsafe_allow_html=True)
+</div>"""
+
+
+@st.cache_resource
+def page_body_html(provider_name: str, model: str, chunk_count: int) -> str:
+    """Build the static page body once per provider/model and index size.
+
+    Everything between the header and the CTA button is emitted as one
+    element; the provider and the chunk count are the only parts that can
+    change.
+    """
+    tech_items = [
+        ("LLM", f"{provider_name} ({model})", "Fastest free-tier inference — sub-second token generation"),
+        ("Embeddings", "all-MiniLM-L6-v2 (ONNX)", "Lightweight (~80MB), runs on CPU, no GPU required"),
+        ("Vector Database", "ChromaDB (persistent)", "Zero infrastructure, pre-computed embeddings load from disk"),
+        ("Framework", "LangChain", "Industry-standard RAG orchestration with provider flexibility"),
+        ("UI", "Streamlit", "Clean chat interface with custom theme"),
+        ("Knowledge Base", "25 curated Stripe pages", "Covers payments, billing, disputes, webhooks, and more"),
+    ]
+    sections = [
+        '<div class="stat-grid">'
+        + "".join(
+            STAT_BOX_TEMPLATE.format(num=num.format(chunks=chunk_count), label=label) for num, label in STATS
+        )
+        + "</div>",
+        SECTION_DIVIDER,
+        SECTION_TITLE_TEMPLATE.format(title="Architecture"),
+        # Padded to the diagram box width so the ASCII borders stay aligned
+        ARCHITECTURE_HTML.format(chunk_label=f"({chunk_count} chunks)".ljust(13)),
+        SECTION_DIVIDER,
+        SECTION_TITLE_TEMPLATE.format(title="The RAG Pipeline"),
+        '<div class="pipeline-grid">'
+        + "".join(
+            PIPELINE_CARD_TEMPLATE.format(num=i, title=title, desc=desc)
+            for i, (title, desc) in enumerate(PIPELINE_STEPS, 1)
+        )
+        + "</div>",
+        SECTION_DIVIDER,
+        SECTION_TITLE_TEMPLATE.format(title="Tech Stack"),
+        "".join(TECH_ROW_TEMPLATE.format(name=name, detail=detail, why=why) for name, detail, why in tech_items),
+        SECTION_DIVIDER,
+        SECTION_TITLE_TEMPLATE.format(title="Key Design Decisions"),
+        "".join(DECISION_CARD_TEMPLATE.format(title=title, desc=desc) for title, desc in DECISIONS),
+        SECTION_DIVIDER,
+        CTA_HTML,
+    ]
+    return "\n".join(sections)
+
+
+st.set_page_config(
+    page_title="How It Works — Stripe Support AI",
+    page_icon="💳",
+    layout="wide",
+)
+
+inject_css("base.css", "how_it_works.css")
+
+# --- Header ---
+st.markdown("# How It Works")
+st.caption("A look under the hood at the RAG (Retrieval Augmented Generation) pipeline powering this assistant.")
+
+# --- Body: stats, architecture, pipeline, tech stack, decisions, CTA ---
+provider = get_provider_info()
+st.html(page_body_html(provider["provider"], provider["model"], get_chunk_count()))
 
 st.link_button(
     "Hire me on Upwork",
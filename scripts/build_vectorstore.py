@@ -3,61 +3,76 @@
 Run locally before deployment:
     python -m scripts.build_vectorstore
 
-This creates the chroma_db/ directory with pre-computed embeddings.
-Commit that directory to the repo so Streamlit Cloud loads from disk.
+This creates the chroma_db/ directory with pre-computed embeddings, plus a
+flat_index/ export of the same vectors for exact in-memory search. Commit
+both directories to the repo so Streamlit Cloud loads from disk.
 """
 
 import os
 import sys
 import re
+import json
+import hashlib
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 import chromadb
-from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+import numpy as np
+from chromadb.config import Settings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+from src.embeddings import TunedONNXMiniLM
 from src.config import (
     CHROMA_PERSIST_DIR,
     STRIPE_DOCS_DIR,
     COLLECTION_NAME,
+    EMBEDDING_CACHE_PATH,
+    FLAT_INDEX_DIR,
     CHUNK_SIZE,
     CHUNK_OVERLAP,
+    CHILD_CHUNK_SIZE,
+    CHILD_CHUNK_OVERLAP,
 )
 
 
+_FRONTMATTER_RE = re.compile(r"\A---(.*?)---(.*)\Z", re.DOTALL)
+_FRONTMATTER_KV_RE = re.compile(r"^([^:\n]+):(.*)$", re.MULTILINE)
+
+
 def parse_frontmatter(content: str) -> tuple[dict, str]:
     """Extract YAML-like frontmatter metadata from a markdown file."""
-    metadata = {}
-    body = content
+    match = _FRONTMATTER_RE.match(content)
+    if not match:
+        return {}, content
 
-    if content.startswith("---"):
-        parts = content.split("---", 2)
-        if len(parts) >= 3:
-            for line in parts[1].strip().split("\n"):
-                if ":" in line:
-                    key, value = line.split(":", 1)
-                    metadata[key.strip()] = value.strip()
-            body = parts[2].strip()
-
-    return metadata, body
+    # Keys repeat across every doc; intern them so all metadata dicts share
+    # one str object per key instead of a fresh copy per file.
+    metadata = {
+        sys.intern(key.strip()): value.strip()
+        for key, value in _FRONTMATTER_KV_RE.findall(match.group(1))
+    }
+    return metadata, match.group(2).strip()
 
 
 def load_docs(docs_dir: str) -> list[dict]:
     """Load all markdown files from the docs directory."""
-    docs = []
-    for filename in sorted(os.listdir(docs_dir)):
-        if not filename.endswith(".md"):
-            continue
+    with os.scandir(docs_dir) as it:
+        entries = sorted((e for e in it if e.name.endswith(".md") and e.is_file()), key=lambda e: e.name)
 
-        filepath = os.path.join(docs_dir, filename)
-        with open(filepath, "r") as f:
-            content = f.read()
+    docs = []
+    for entry in entries:
+        filename = entry.name
+        # Read raw bytes and decode once as UTF-8, skipping locale-dependent text I/O
+        with open(entry.path, "rb") as f:
+            content = f.read().decode("utf-8")
 
         metadata, body = parse_frontmatter(content)
         metadata["source"] = filename
         metadata.setdefault("title", filename.replace(".md", "").replace("_", " ").title())
-        metadata.setdefault("category", "General")
+        # A handful of categories are shared by every doc and all their chunks
+        metadata["category"] = sys.intern(metadata.get("category", "General"))
 
         docs.append({"content": body, "metadata": metadata})
 
@@ -65,29 +80,143 @@ def load_docs(docs_dir: str) -> list[dict]:
 
 
 def chunk_docs(docs: list[dict]) -> list[dict]:
-    """Split documents into chunks with metadata."""
-    splitter = RecursiveCharacterTextSplitter(
+    """Split documents into small-to-big chunks with metadata.
+
+    Each document is split into parent chunks, and each parent into smaller
+    child chunks. Children are what gets embedded (tighter matches); each
+    carries its parent's id and text so retrieval can hand the LLM the
+    fuller parent passage.
+    """
+    separators = ["\n## ", "\n### ", "\n\n", "\n", " "]
+    parent_splitter = RecursiveCharacterTextSplitter(
         chunk_size=CHUNK_SIZE,
         chunk_overlap=CHUNK_OVERLAP,
-        separators=["\n## ", "\n### ", "\n\n", "\n", " "],
+        separators=separators,
+        length_function=len,
+    )
+    child_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHILD_CHUNK_SIZE,
+        chunk_overlap=CHILD_CHUNK_OVERLAP,
+        separators=separators,
+        length_function=len,
+    )
+
+    # Split every doc in one call; parents come back in doc order, each with
+    # its own copy of the doc's metadata.
+    parents = parent_splitter.create_documents(
+        [doc["content"] for doc in docs],
+        metadatas=[doc["metadata"] for doc in docs],
     )
 
     chunks = []
-    for doc in docs:
-        splits = splitter.split_text(doc["content"])
-        for i, text in enumerate(splits):
+    chunk_counts = {}
+    for parent in parents:
+        parent_text = parent.page_content
+        # All children of a parent share identical metadata, so fill in the
+        # parent's copy once rather than re-merging the doc dict per child.
+        parent_metadata = parent.metadata
+        source = parent_metadata["source"]
+        i = chunk_counts.get(source, 0)
+        chunk_counts[source] = i + 1
+
+        parent_id = f"{source}_{i}"
+        parent_metadata["chunk_index"] = i
+        parent_metadata["parent_id"] = parent_id
+        parent_metadata["parent_text"] = parent_text
+        for j, child_text in enumerate(child_splitter.split_text(parent_text)):
             chunks.append({
-                "id": f"{doc['metadata']['source']}_{i}",
-                "content": text,
-                "metadata": {
-                    **doc["metadata"],
-                    "chunk_index": i,
-                },
+                "id": f"{parent_id}_{j}",
+                "content": child_text,
+                "metadata": parent_metadata,
             })
 
     return chunks
 
 
+def embed_texts(ef, texts: list[str], batch_size: int = 32) -> np.ndarray:
+    """Embed texts in parallel mini-batches, normalized to unit length.
+
+    ONNX Runtime releases the GIL while it runs, so worker threads overlap
+    tokenization and Python overhead with model compute. Pass an ef with a
+    single intra-op thread; the fan-out here already uses every core.
+    """
+    batches = [texts[i : i + batch_size] for i in range(0, len(texts), batch_size)]
+    if not batches:
+        return np.empty((0, 0), dtype=np.float32)
+
+    # Run the first batch on the main thread so the ONNX session is created once
+    results = [ef(batches[0])]
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+        results.extend(executor.map(ef, batches[1:]))
+
+    # MiniLM already emits unit vectors; normalizing again guarantees the
+    # cosine index sees them even if the embedding function changes.
+    vectors = np.asarray([e for batch in results for e in batch], dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def embed_chunks(ef, chunks: list[dict], cache_path: str = EMBEDDING_CACHE_PATH) -> list[list[float]]:
+    """Embed chunks, reusing vectors cached on disk by content hash.
+
+    Only chunk texts not already in the cache go through the model, so a
+    rebuild after editing a few docs re-embeds just the changed chunks.
+    Delete the cache file if the embedding model changes.
+    """
+    hashes = [hashlib.sha256(c["content"].encode("utf-8")).hexdigest() for c in chunks]
+
+    conn = sqlite3.connect(cache_path)
+    try:
+        conn.execute("CREATE TABLE IF NOT EXISTS embeddings (sha256 TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        cached = {}
+        unique = list(dict.fromkeys(hashes))
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(unique), 500):
+            batch = unique[i : i + 500]
+            rows = conn.execute(
+                f"SELECT sha256, vector FROM embeddings WHERE sha256 IN ({','.join('?' * len(batch))})",
+                batch,
+            )
+            cached.update((h, np.frombuffer(blob, dtype=np.float32)) for h, blob in rows)
+
+        texts = {h: c["content"] for h, c in zip(hashes, chunks) if h not in cached}
+        duplicates = len(hashes) - len(unique)
+        print(f"  {len(cached)} cached, {len(texts)} to embed, {duplicates} duplicate texts")
+        if texts:
+            vectors = embed_texts(ef, list(texts.values()))
+            fresh = dict(zip(texts, vectors))
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (sha256, vector) VALUES (?, ?)",
+                    ((h, v.tobytes()) for h, v in fresh.items()),
+                )
+            cached.update(fresh)
+    finally:
+        conn.close()
+
+    return [cached[h].tolist() for h in hashes]
+
+
+def export_flat_index(chunks: list[dict], embeddings: list[list[float]], out_dir: str = FLAT_INDEX_DIR) -> None:
+    """Write vectors and chunk payloads for the app's memory-mapped flat index.
+
+    Vectors go to a raw .npy the app can mmap; ids, texts and metadata go to
+    JSON so loading never unpickles anything.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, "vectors.npy"), np.asarray(embeddings, dtype=np.float32))
+    with open(os.path.join(out_dir, "chunks.json"), "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "ids": [c["id"] for c in chunks],
+                "documents": [c["content"] for c in chunks],
+                "metadatas": [c["metadata"] for c in chunks],
+            },
+            f,
+            ensure_ascii=False,
+        )
+
+
 def build():
     """Build the ChromaDB vectorstore from Stripe docs."""
     print(f"Loading docs from {STRIPE_DOCS_DIR}...")
@@ -100,7 +229,10 @@ def build():
 
     # Clear and recreate the collection
     print(f"Building vectorstore at {CHROMA_PERSIST_DIR}...")
-    client = chromadb.PersistentClient(path=CHROMA_PERSIST_DIR)
+    client = chromadb.PersistentClient(
+        path=CHROMA_PERSIST_DIR,
+        settings=Settings(anonymized_telemetry=False),
+    )
 
     # Delete existing collection if it exists
     try:
@@ -108,23 +240,36 @@ def build():
     except Exception:
         pass
 
-    ef = DefaultEmbeddingFunction()
+    # One intra-op thread per session: embed_texts runs one batch per core,
+    # so a multi-threaded session would oversubscribe the CPU.
+    ef = TunedONNXMiniLM(threads=1)
     collection = client.create_collection(
         name=COLLECTION_NAME,
         embedding_function=ef,
+        # MiniLM is trained for cosine similarity
+        metadata={"hnsw:space": "cosine"},
     )
 
-    # Add chunks in batches
-    batch_size = 50
+    # Embed all chunks up front so collection.add stores the vectors
+    # instead of embedding per batch.
+    print("Embedding chunks...")
+    embeddings = embed_chunks(ef, chunks)
+
+    # Add chunks in batches — larger batches amortize SQLite transaction cost
+    batch_size = 200
     for i in range(0, len(chunks), batch_size):
         batch = chunks[i : i + batch_size]
         collection.add(
             ids=[c["id"] for c in batch],
             documents=[c["content"] for c in batch],
             metadatas=[c["metadata"] for c in batch],
+            embeddings=embeddings[i : i + batch_size],
         )
         print(f"  Added batch {i // batch_size + 1}/{(len(chunks) - 1) // batch_size + 1}")
 
+    print(f"Exporting flat index to {FLAT_INDEX_DIR}...")
+    export_flat_index(chunks, embeddings)
+
     print(f"\nDone! Collection '{COLLECTION_NAME}' has {collection.count()} chunks.")
 
     # Test query
@@ -1,62 +1,98 @@
 import time
-from langchain_core.messages import HumanMessage, AIMessage
+from concurrent.futures import ThreadPoolExecutor
 from src.llm import get_llm
-from src.vectorstore import retrieve
-from src.prompts import SYSTEM_TEMPLATE
+from src.vectorstore import retrieve, load_retrieval_resources
+from src.prompts import SYSTEM_PREFIX, SYSTEM_SUFFIX
+from src.config import HISTORY_MAX_MESSAGES, SIMILARITY_THRESHOLD, MAX_CONTEXT_CHARS
 
+CONTEXT_SEPARATOR = "\n\n---\n\n"
 
-def format_context(docs: list[dict]) -> str:
-    """Format retrieved documents into a context string for the LLM."""
+
+def format_context(docs: list[dict], max_chars: int = MAX_CONTEXT_CHARS) -> tuple[str, int]:
+    """Format retrieved documents into a context string for the LLM.
+
+    Documents are added in rank order until max_chars is reached; the one
+    that crosses the budget is cut at its last paragraph break that fits.
+    Returns the context and how many of docs made it in (docs[:n]).
+    """
     parts = []
+    used = 0
     for i, doc in enumerate(docs, 1):
-        parts.append(f"[Source {i}: {doc['title']}]\n{doc['content']}")
-    return "\n\n---\n\n".join(parts)
+        header = f"[Source {i}: {doc['title']}]\n"
+        content = doc["content"]
+        remaining = max_chars - used - len(header)
+        if len(content) > remaining:
+            cut = content.rfind("\n\n", 0, max(remaining, 0))
+            if cut <= 0 and not parts:
+                cut = remaining  # Never send the top source empty-handed
+            if cut > 0:
+                parts.append(header + content[:cut])
+            break
+        parts.append(header + content)
+        used += len(header) + len(content) + len(CONTEXT_SEPARATOR)
+    return CONTEXT_SEPARATOR.join(parts), len(parts)
+
+
+# Runs retrieval off the main thread so prompt setup overlaps with it
+_RETRIEVAL_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="retrieve")
+
 
+# Session state role -> LangChain message role
+ROLE_MAP = {"user": "human", "assistant": "assistant"}
 
-def format_chat_history(messages: list[dict]) -> list:
-    """Convert session state messages to LangChain message objects."""
-    history = []
-    for msg in messages:
-        if msg["role"] == "user":
-            history.append(HumanMessage(content=msg["content"]))
-        elif msg["role"] == "assistant":
-            history.append(AIMessage(content=msg["content"]))
-    return history
 
+def format_chat_history(messages: list[dict]) -> list[tuple[str, str]]:
+    """Convert session state messages to (role, content) tuples for LangChain."""
+    return [(ROLE_MAP[m["role"]], m["content"]) for m in messages if m["role"] in ROLE_MAP]
 
-def ask(question: str, chat_history: list[dict] | None = None) -> dict:
+
+def ask(question: str, chat_history: list[dict] | None = None, query_embedding=None) -> dict:
     """Run the full RAG pipeline: retrieve → format → generate.
 
+    Retrieval runs on a worker thread while history is formatted and the
+    LLM client is loaded; the cached resources it uses are loaded on the
+    calling thread first. Chunks scoring below SIMILARITY_THRESHOLD are
+    dropped, as are any that don't fit the context budget, so the returned
+    sources are exactly the ones the prompt cites.
+
+    query_embedding, if given, is the precomputed embedding of question and
+    is used for retrieval instead of embedding the question again.
+
     Returns a dict with keys: answer (str generator for streaming),
-    sources (list of retrieved docs), response_time (float).
+    sources (list of retrieved docs), retrieval_time (float seconds spent
+    before streaming starts), start_time (time.perf_counter() at entry).
     """
-    start = time.time()
+    start = time.perf_counter()
 
-    # 1. Retrieve relevant chunks
-    sources = retrieve(question)
+    # 1. Retrieve relevant chunks in the background. Cached resources are
+    # loaded here first, since a cold load needs the script run context.
+    load_retrieval_resources(query_embedding)
+    pending_sources = _RETRIEVAL_EXECUTOR.submit(retrieve, question, query_embedding=query_embedding)
 
-    # 2. Build the prompt with context
-    context = format_context(sources)
-    history = format_chat_history(chat_history or [])
+    # 2. Meanwhile, format history and load the LLM client
+    history = format_chat_history((chat_history or [])[-HISTORY_MAX_MESSAGES:])
+    llm = get_llm()
+
+    # 3. Build the prompt with context
+    sources = [doc for doc in pending_sources.result() if doc["score"] >= SIMILARITY_THRESHOLD]
+    context, included = format_context(sources)
+    # Only cite the sources the prompt actually contains
+    sources = sources[:included]
 
     messages = [
-        ("system", SYSTEM_TEMPLATE.format(context=context)),
-        *[
-            ("human" if isinstance(m, HumanMessage) else "assistant", m.content)
-            for m in history[-10:]  # Keep last 5 exchanges (10 messages)
-        ],
+        ("system", "".join((SYSTEM_PREFIX, context, SYSTEM_SUFFIX))),
+        *history,
         ("human", question),
     ]
 
-    # 3. Stream the response from the LLM
-    llm = get_llm()
+    # 4. Stream the response from the LLM
 
     def stream_response():
         for chunk in llm.stream(messages):
             if chunk.content:
                 yield chunk.content
 
-    retrieval_time = time.time() - start
+    retrieval_time = time.perf_counter() - start
 
     return {
         "answer": stream_response(),
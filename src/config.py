@@ -31,17 +31,47 @@ PROVIDER_CONFIGS = {
 LLM_TEMPERATURE = 0.1
 LLM_MAX_TOKENS = 1024
 
+# Conversation memory
+HISTORY_MAX_MESSAGES = 10  # Last 5 exchanges (user + assistant)
+
+# Chat rendering
+CHAT_RENDER_WINDOW = 20  # Messages always drawn; older ones sit behind a toggle
+
+# Streaming parameters
+STREAM_FLUSH_INTERVAL = 0.05  # Seconds between Markdown re-renders while streaming
+STREAM_BUFFER_SIZE = 256  # Tokens read ahead of the renderer before the reader pauses
+
+# Query embedding (ONNX Runtime threads per forward pass)
+EMBEDDING_THREADS = min(4, os.cpu_count() or 1)
+
 # Retrieval parameters
 RETRIEVER_K = 4
-SIMILARITY_THRESHOLD = 0.3
+RETRIEVER_CANDIDATES = 12  # Child chunks fetched before collapsing to K parents
+SIMILARITY_THRESHOLD = 0.3  # Cosine similarity a chunk needs to reach the prompt
+MAX_CONTEXT_CHARS = 3000  # Budget for retrieved text in the system prompt
+
+# Semantic cache parameters (per session, keyed by question and conversation history)
+SEMANTIC_CACHE_THRESHOLD = 0.9  # Cosine similarity needed to reuse an answer
+SEMANTIC_CACHE_MAX_ENTRIES = 100
 
 # Paths
 CHROMA_PERSIST_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "chroma_db")
 STRIPE_DOCS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "stripe_docs")
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "static")
+FLAT_INDEX_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "flat_index")
+EMBEDDING_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "embeddings_cache.sqlite")
+
+# Optional chat history persistence (disabled unless a directory is set)
+CHAT_HISTORY_DIR = os.getenv("CHAT_HISTORY_DIR")
+METADATA_SAVE_EVERY = 5  # Rewrite session metadata every N exchanges
+RECENT_SESSIONS_LIMIT = 5  # Past conversations listed in the sidebar
 
-# Chunking parameters (used by build script)
+# Chunking parameters (used by build script). Small child chunks are embedded
+# for precise matching; the parent chunk they came from is what the LLM sees.
 CHUNK_SIZE = 1000
-CHUNK_OVERLAP = 200
+CHUNK_OVERLAP = 0
+CHILD_CHUNK_SIZE = 300
+CHILD_CHUNK_OVERLAP = 50
 
 # Collection name
 COLLECTION_NAME = "stripe_docs"
@@ -55,3 +85,9 @@ SUGGESTED_QUESTIONS = [
     "What's the difference between PaymentIntents and Charges?",
     "How do I handle failed payments?",
 ]
+
+# Filler replies answered directly, without running the RAG pipeline
+ACKNOWLEDGEMENTS = {
+    "thanks", "thank you", "thx", "ty", "ok", "okay", "cool", "great", "got it", "perfect",
+}
+ACKNOWLEDGEMENT_REPLY = "Happy to help! Anything else about Stripe?"
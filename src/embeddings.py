@@ -1,12 +1,57 @@
+from functools import cached_property, lru_cache
+import os
 import streamlit as st
-from chromadb.utils.embedding_functions import DefaultEmbeddingFunction
+from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+from src.config import EMBEDDING_THREADS
+
+
+class TunedONNXMiniLM(ONNXMiniLM_L6_V2):
+    """ChromaDB's all-MiniLM-L6-v2 embedder with a pinned ONNX thread count.
+
+    Same model, tokenizer and vectors as Chroma's; the session differs only
+    in running sequentially with intra_op_num_threads set to threads,
+    instead of sizing its thread pool to every core.
+    """
+
+    def __init__(self, threads: int = EMBEDDING_THREADS, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self._threads = threads
+
+    @cached_property
+    def model(self):
+        providers = list(self._preferred_providers or self.ort.get_available_providers())
+        # As upstream: CoreML is slower than the CPU provider for this model
+        if "CoreMLExecutionProvider" in providers:
+            providers.remove("CoreMLExecutionProvider")
+
+        so = self.ort.SessionOptions()
+        so.log_severity_level = 3
+        so.graph_optimization_level = self.ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        so.execution_mode = self.ort.ExecutionMode.ORT_SEQUENTIAL
+        so.intra_op_num_threads = self._threads
+
+        return self.ort.InferenceSession(
+            os.path.join(self.DOWNLOAD_PATH, self.EXTRACTED_FOLDER_NAME, "model.onnx"),
+            providers=providers,
+            sess_options=so,
+        )
 
 
 @st.cache_resource
 def get_embedding_function():
-    """Load ChromaDB's default ONNX embedding function (all-MiniLM-L6-v2).
+    """Load ChromaDB's ONNX embedding function (all-MiniLM-L6-v2).
 
     Uses ONNX runtime instead of full sentence-transformers, keeping memory
     footprint under ~100MB — critical for Streamlit Cloud's 1GB limit.
     """
-    return DefaultEmbeddingFunction()
+    return TunedONNXMiniLM()
+
+
+@lru_cache(maxsize=512)
+def embed_query(text: str) -> tuple[float, ...]:
+    """Embed a single query string with the shared embedding function.
+
+    Memoized per query string, so repeated questions skip the ONNX forward
+    pass. Returned as a tuple so the cached value can't be mutated.
+    """
+    return tuple(map(float, get_embedding_function()([text])[0]))
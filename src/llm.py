@@ -1,10 +1,26 @@
 import os
-import importlib
+from importlib import import_module
 import streamlit as st
 from src.config import LLM_PROVIDER, PROVIDER_CONFIGS, LLM_TEMPERATURE, LLM_MAX_TOKENS
 
+# Resolved chat model classes, keyed by provider name
+_CLASS_CACHE: dict[str, type] = {}
 
-@st.cache_resource
+
+def get_llm_class(provider: str, config: dict) -> type:
+    """Import and return the provider's chat model class.
+
+    The provider package is only imported on first use (langchain_groq and
+    friends pull in httpx and pydantic), then served from _CLASS_CACHE.
+    """
+    llm_class = _CLASS_CACHE.get(provider)
+    if llm_class is None:
+        llm_class = getattr(import_module(config["module"]), config["class_name"])
+        _CLASS_CACHE[provider] = llm_class
+    return llm_class
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
 def get_llm():
     """Create the LLM client based on the configured provider.
 
@@ -19,8 +35,7 @@ def get_llm():
     if not api_key:
         raise ValueError(f"Missing API key. Set {config['env_var']} in your environment or .env file.")
 
-    module = importlib.import_module(config["module"])
-    llm_class = getattr(module, config["class_name"])
+    llm_class = get_llm_class(LLM_PROVIDER, config)
 
     return llm_class(
         model=config["model"],
@@ -30,8 +45,13 @@ def get_llm():
     )
 
 
+@st.cache_resource
 def get_provider_info() -> dict:
-    """Return display info about the current LLM provider."""
+    """Return display info about the current LLM provider.
+
+    Cached so the app and pages don't rebuild it on every Streamlit rerun.
+    The same dict is shared by every caller, so treat it as read-only.
+    """
     config = PROVIDER_CONFIGS.get(LLM_PROVIDER, {})
     return {
         "provider": LLM_PROVIDER.capitalize(),
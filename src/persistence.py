@@ -0,0 +1,125 @@
+"""Optional on-disk chat history, enabled by setting CHAT_HISTORY_DIR.
+
+Each session is stored as two files: an append-only <id>.jsonl transcript
+(one message per line, so saving a turn never rewrites earlier ones) and
+a small <id>.json metadata file, replaced atomically. Listing sessions
+reads only the metadata files.
+"""
+
+import json
+import logging
+import os
+import re
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends still work, just without the lock
+    fcntl = None
+
+from src.config import CHAT_HISTORY_DIR
+
+_SESSION_ID_RE = re.compile(r"[0-9a-f]{32}")
+
+logger = logging.getLogger(__name__)
+
+
+def new_session_id() -> str:
+    """Return a fresh random session id."""
+    return uuid.uuid4().hex
+
+
+def is_valid_session_id(session_id: str) -> bool:
+    """Only accept ids we generate, so a URL can't point outside the history dir."""
+    return bool(_SESSION_ID_RE.fullmatch(session_id or ""))
+
+
+def _path(session_id: str, ext: str) -> str:
+    return os.path.join(CHAT_HISTORY_DIR, f"{session_id}{ext}")
+
+
+def append_message(session_id: str, message: dict):
+    """Append one message to the session transcript under an exclusive lock."""
+    os.makedirs(CHAT_HISTORY_DIR, exist_ok=True)
+    line = (json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8")
+    with open(_path(session_id, ".jsonl"), "ab+") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            # If a crash cut the last write short, start on a fresh line so
+            # this message isn't glued onto the partial one.
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    line = b"\n" + line
+            f.write(line)
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def save_metadata(session_id: str, metadata: dict):
+    """Write session metadata via a temp file and an atomic rename."""
+    os.makedirs(CHAT_HISTORY_DIR, exist_ok=True)
+    path = _path(session_id, ".json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(metadata, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def list_sessions(limit: int) -> list[dict]:
+    """Return metadata for the most recently updated sessions, newest first.
+
+    Reads only the small .json metadata files, never the transcripts.
+    Unreadable metadata files are skipped.
+    """
+    if not os.path.isdir(CHAT_HISTORY_DIR):
+        return []
+
+    sessions = []
+    with os.scandir(CHAT_HISTORY_DIR) as it:
+        for entry in it:
+            session_id, ext = os.path.splitext(entry.name)
+            if ext != ".json" or not is_valid_session_id(session_id):
+                continue
+            try:
+                with open(entry.path, "r", encoding="utf-8") as f:
+                    metadata = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                logger.warning("Skipping unreadable session metadata %s", entry.path)
+                continue
+            if isinstance(metadata, dict):
+                # Trust the validated file name over the id stored inside
+                metadata["session_id"] = session_id
+                sessions.append(metadata)
+
+    sessions.sort(key=lambda m: m.get("updated_at", 0), reverse=True)
+    return sessions[:limit]
+
+
+def load_messages(session_id: str) -> list[dict]:
+    """Read a session transcript, or return [] if there isn't one.
+
+    Lines that don't decode to a message (e.g. a write cut off by a crash)
+    are logged and skipped, so one bad append can't break the session.
+    """
+    path = _path(session_id, ".jsonl")
+    if not os.path.exists(path):
+        return []
+
+    messages = []
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning("Skipping undecodable line %d in %s", line_no, path)
+                continue
+            if isinstance(message, dict) and "role" in message and "content" in message:
+                messages.append(message)
+            else:
+                logger.warning("Skipping malformed message on line %d in %s", line_no, path)
+    return messages
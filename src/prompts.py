@@ -15,6 +15,10 @@ CONTEXT FROM STRIPE DOCUMENTATION:
 
 If the question is outside the scope of the provided Stripe documentation, politely let the user know and suggest they check Stripe's official documentation at https://docs.stripe.com."""
 
+# SYSTEM_TEMPLATE split around {context}, so the chain can concatenate the
+# retrieved context without a str.format pass over the whole prompt.
+SYSTEM_PREFIX, SYSTEM_SUFFIX = SYSTEM_TEMPLATE.split("{context}")
+
 CONDENSE_TEMPLATE = """Given the following conversation history and a follow-up question, rephrase the follow-up question to be a standalone question that captures the full context needed to search the documentation.
 
 Chat History:
@@ -0,0 +1,50 @@
+import numpy as np
+from src.config import SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_MAX_ENTRIES
+
+
+def _normalize(embedding) -> np.ndarray:
+    """Return the embedding as a unit-length float32 vector."""
+    vec = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+def lookup_cached_answer(cache: list[dict], embedding, history: tuple = ()) -> dict | None:
+    """Return the cached entry closest to the question embedding, if similar enough.
+
+    Only entries cached after the same conversation history are candidates,
+    since the chain's answer depends on it as well as on the question.
+    Candidates are compared by cosine similarity; anything below
+    SEMANTIC_CACHE_THRESHOLD is treated as a miss.
+    """
+    candidates = [entry for entry in cache if entry["history"] == history]
+    if not candidates:
+        return None
+
+    query = _normalize(embedding)
+    scores = np.stack([entry["embedding"] for entry in candidates]) @ query
+    best = int(np.argmax(scores))
+    if scores[best] < SEMANTIC_CACHE_THRESHOLD:
+        return None
+    return candidates[best]
+
+
+def cache_answer(
+    cache: list[dict],
+    embedding,
+    answer: str,
+    source_refs: list[tuple[str, float]],
+    history: tuple = (),
+):
+    """Store a completed answer, evicting the oldest entry once the cache is full.
+
+    history is the (role, content) pairs the answer was generated with.
+    """
+    cache.append({
+        "embedding": _normalize(embedding),
+        "history": history,
+        "answer": answer,
+        "source_refs": source_refs,
+    })
+    if len(cache) > SEMANTIC_CACHE_MAX_ENTRIES:
+        del cache[0]
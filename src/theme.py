@@ -0,0 +1,26 @@
+import os
+import streamlit as st
+from src.config import STATIC_DIR
+
+
+@st.cache_resource
+def load_css(*filenames: str) -> str:
+    """Read and concatenate stylesheets from static/ once per process.
+
+    Pages pass base.css first, followed by their own stylesheet. Cached as
+    a resource so every rerun gets the same string object, not a copy.
+    """
+    parts = []
+    for filename in filenames:
+        with open(os.path.join(STATIC_DIR, filename), "r") as f:
+            parts.append(f.read())
+    return f"<style>\n{''.join(parts)}</style>"
+
+
+def inject_css(*filenames: str):
+    """Emit the page stylesheet.
+
+    This has to run on every rerun: Streamlit removes any element a rerun
+    doesn't re-emit, so injecting once per session would unstyle the page.
+    """
+    st.markdown(load_css(*filenames), unsafe_allow_html=True)
@@ -0,0 +1,62 @@
+from functools import lru_cache
+import streamlit as st
+
+# HTML builders for the chat UI. They live here rather than in app.py because
+# Streamlit re-executes app.py as a fresh module on every rerun; memo caches
+# defined there start empty each time, while this module is imported once.
+
+SOURCE_CARD_TEMPLATE = """
+<div class="source-card">
+    <div class="source-category">{category}</div>
+    <div class="source-header">
+        <span class="source-title">{title}</span>
+        <span class="source-score">{score:.0%} match</span>
+    </div>
+    <div class="source-preview">{preview}...</div>
+</div>"""
+
+
+@lru_cache(maxsize=512)
+def source_card_html(title: str, category: str, score: float, preview: str) -> str:
+    """Build the HTML for one source citation card (memoized per process)."""
+    return SOURCE_CARD_TEMPLATE.format(title=title, category=category, score=score, preview=preview)
+
+
+@st.cache_resource
+def get_source_store() -> dict:
+    """Card data for every chunk cited so far, keyed by chunk id.
+
+    Shared across sessions and bounded by the size of the corpus, so chat
+    messages only need to keep (chunk id, score) pairs.
+    """
+    return {}
+
+
+@lru_cache(maxsize=256)
+def sources_html(source_refs: tuple[tuple[str, float], ...]) -> str:
+    """Build the full card list for one message (memoized per process).
+
+    Callers must add every cited chunk to the source store first, so a
+    cached list is never missing cards.
+    """
+    store = get_source_store()
+    cards = []
+    for chunk_id, score in source_refs:
+        src = store.get(chunk_id)
+        if src:
+            cards.append(source_card_html(src["title"], src["category"], score, src["preview"]))
+    return "".join(cards)
+
+
+RESPONSE_META_TEMPLATE = """
+<div class="response-meta">
+    <span class="meta-item"><span class="meta-dot"></span> {0:.1f}s</span>
+    <span class="meta-item">{1}</span>
+    <span class="meta-item">{2}</span>
+</div>"""
+
+
+@lru_cache(maxsize=512)
+def response_meta_html(response_time: float, provider_name: str, model: str) -> str:
+    """Build the response metadata footer (memoized per process)."""
+    return RESPONSE_META_TEMPLATE.format(response_time, provider_name, model)
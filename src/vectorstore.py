@@ -1,45 +1,178 @@
+import json
+import os
+import numpy as np
 import streamlit as st
 import chromadb
-from src.config import CHROMA_PERSIST_DIR, COLLECTION_NAME, RETRIEVER_K
-from src.embeddings import get_embedding_function
+from chromadb.config import Settings
+from src.config import CHROMA_PERSIST_DIR, COLLECTION_NAME, FLAT_INDEX_DIR, RETRIEVER_K, RETRIEVER_CANDIDATES
+from src.embeddings import get_embedding_function, embed_query
 
 
-@st.cache_resource
+@st.cache_resource(show_spinner=False, max_entries=1)
 def get_vectorstore():
-    """Load the pre-built ChromaDB collection from disk."""
-    client = chromadb.PersistentClient(path=CHROMA_PERSIST_DIR)
-    collection = client.get_collection(
-        name=COLLECTION_NAME,
-        embedding_function=get_embedding_function(),
+    """Load the pre-built ChromaDB collection from disk.
+
+    No embedding function is passed: every query arrives already embedded,
+    and Chroma rejects one whose name differs from the function the store
+    was built with.
+    """
+    client = chromadb.PersistentClient(
+        path=CHROMA_PERSIST_DIR,
+        settings=Settings(anonymized_telemetry=False),
+    )
+    return client.get_collection(name=COLLECTION_NAME)
+
+
+def distance_to_similarity(distance: float, space: str) -> float:
+    """Convert a Chroma distance to cosine similarity for unit-length vectors.
+
+    MiniLM embeddings are normalized, so cosine distance is 1 - cos and
+    squared L2 (Chroma's default space) is 2 - 2cos.
+    """
+    if space == "cosine":
+        return 1.0 - distance
+    return 1.0 - distance / 2.0
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def get_flat_index() -> dict | None:
+    """Load the flat vector index exported by the build script, if present.
+
+    Vectors are memory-mapped, so startup skips deserialization and the OS
+    pages them in on first use. Returns None when no export exists.
+    """
+    vectors_path = os.path.join(FLAT_INDEX_DIR, "vectors.npy")
+    chunks_path = os.path.join(FLAT_INDEX_DIR, "chunks.json")
+    if not (os.path.exists(vectors_path) and os.path.exists(chunks_path)):
+        return None
+
+    with open(chunks_path, encoding="utf-8") as f:
+        chunks = json.load(f)
+    return {
+        "vectors": np.load(vectors_path, mmap_mode="r"),
+        "ids": chunks["ids"],
+        "documents": chunks["documents"],
+        "metadatas": chunks["metadatas"],
+    }
+
+
+def get_chunk_count() -> int:
+    """Number of embedded chunks in the index retrieve() searches."""
+    index = get_flat_index()
+    if index is not None:
+        return len(index["ids"])
+    return get_vectorstore().count()
+
+
+def load_retrieval_resources(query_embedding=None):
+    """Load the cached resources retrieve() will need, on the calling thread.
+
+    Call this from the script thread before running retrieve() on a worker:
+    a cold st.cache_resource call expects the script run context (its
+    spinner renders there), which worker threads don't have.
+    """
+    if get_flat_index() is None:
+        get_vectorstore()
+    if query_embedding is None:
+        get_embedding_function()
+
+
+def collapse_hits(ids, docs, metas, similarities, k: int) -> list[dict]:
+    """Turn ranked child-chunk hits into at most k distinct parent results.
+
+    Content is the parent text, and each parent is scored by its
+    best-matching child. Stores built before parent/child chunking have no
+    parent metadata, so every hit stands alone.
+    """
+    documents = []
+    seen_parents = set()
+    for chunk_id, content, metadata, similarity in zip(ids, docs, metas, similarities):
+        parent_id = metadata.get("parent_id", chunk_id)
+        if parent_id in seen_parents:
+            continue
+        seen_parents.add(parent_id)
+
+        documents.append({
+            "id": chunk_id,
+            "content": metadata.get("parent_text", content),
+            "source": metadata.get("source", "unknown"),
+            "title": metadata.get("title", "Untitled"),
+            "category": metadata.get("category", "General"),
+            "score": similarity,
+        })
+        if len(documents) == k:
+            break
+
+    return documents
+
+
+def retrieve_flat(index: dict, query_embedding, k: int = RETRIEVER_K) -> list[dict]:
+    """Exact top-k search over the flat index with one matrix-vector product.
+
+    Vectors are unit length, so the dot product is the cosine similarity.
+    """
+    similarities = index["vectors"] @ np.asarray(query_embedding, dtype=np.float32)
+    n = min(max(k, RETRIEVER_CANDIDATES), len(similarities))
+    if n == 0:
+        return []
+
+    top = np.argpartition(-similarities, n - 1)[:n]
+    top = top[np.argsort(-similarities[top])]
+    return collapse_hits(
+        [index["ids"][i] for i in top],
+        [index["documents"][i] for i in top],
+        [index["metadatas"][i] for i in top],
+        similarities[top].tolist(),
+        k,
     )
-    return collection
 
 
-def retrieve(query: str, k: int = RETRIEVER_K) -> list[dict]:
+def retrieve(query: str, k: int = RETRIEVER_K, query_embedding=None) -> list[dict]:
     """Retrieve the top-k most relevant document chunks for a query.
 
-    Returns a list of dicts with keys: content, source, title, category, score.
+    Pass query_embedding when the query has already been embedded; otherwise
+    it comes from the memoized embed_query, so repeated queries skip ONNX.
+
+    Searches the flat index when the build exported one, else ChromaDB.
+    Child-chunk hits are collapsed to parents by collapse_hits.
+
+    Returns a list of dicts with keys: id, content, source, title, category, score.
     """
+    if query_embedding is None:
+        query_embedding = embed_query(query)
+
+    index = get_flat_index()
+    if index is not None:
+        return retrieve_flat(index, query_embedding, k)
+
     collection = get_vectorstore()
     results = collection.query(
-        query_texts=[query],
-        n_results=k,
+        query_embeddings=[list(query_embedding)],
+        n_results=max(k, RETRIEVER_CANDIDATES),
         include=["documents", "metadatas", "distances"],
     )
 
-    documents = []
-    for i in range(len(results["ids"][0])):
-        distance = results["distances"][0][i]
-        # ChromaDB returns L2 distance by default; lower = more similar.
-        # Convert to a 0-1 similarity score for display.
-        similarity = 1 / (1 + distance)
+    # Stores built before the switch to cosine use Chroma's default L2 space
+    space = (collection.metadata or {}).get("hnsw:space", "l2")
+    similarities = [distance_to_similarity(d, space) for d in results["distances"][0]]
+    return collapse_hits(
+        results["ids"][0], results["documents"][0], results["metadatas"][0], similarities, k
+    )
 
-        documents.append({
-            "content": results["documents"][0][i],
-            "source": results["metadatas"][0][i].get("source", "unknown"),
-            "title": results["metadatas"][0][i].get("title", "Untitled"),
-            "category": results["metadatas"][0][i].get("category", "General"),
-            "score": round(similarity, 3),
-        })
 
-    return documents
+def get_chunks(ids: list[str]) -> list[dict]:
+    """Fetch stored chunks by id, with content resolved to the parent text.
+
+    Returns a list of dicts with keys: id, content, source, title, category.
+    """
+    results = get_vectorstore().get(ids=ids, include=["documents", "metadatas"])
+    return [
+        {
+            "id": chunk_id,
+            "content": metadata.get("parent_text", content),
+            "source": metadata.get("source", "unknown"),
+            "title": metadata.get("title", "Untitled"),
+            "category": metadata.get("category", "General"),
+        }
+        for chunk_id, content, metadata in zip(results["ids"], results["documents"], results["metadatas"])
+    ]